@@ -24,9 +24,19 @@ def crear_agente_evaluador(drive_service):
     agent_tools = _load_langchain_tools(tools)
     llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0)
 
+    class ArgumentoPlan(BaseModel):
+        nombre: str = Field(..., description="Nombre exacto del parámetro de la herramienta (ej. 'file_name', 'folder_path', 'file_id').")
+        valor: str = Field(..., description="Valor literal tal y como aparece en la petición del usuario, o '$paso_N' para usar los IDs devueltos por el paso N.")
+
+    class PasoPlan(BaseModel):
+        herramienta: str = Field(..., description="Nombre exacto de una de las herramientas disponibles.")
+        argumentos: List[ArgumentoPlan] = Field(default_factory=list, description="Argumentos con los que se llama a la herramienta.")
+        depende_de: List[int] = Field(default_factory=list, description="Índices (empezando en 0) de los pasos cuyo resultado necesita este paso.")
+
     class AgenteOutput(BaseModel):
         result: bool = Field(..., description="Indica si el agente puede realizar la tarea con las herramientas disponibles.")
         explicacion: str = Field(..., description="Explicación detallada de la decisión: qué herramientas usar si la tarea es posible o qué herramienta falta si no es posible.")
+        plan: List[PasoPlan] = Field(default_factory=list, description="Plan ejecutable paso a paso con las herramientas disponibles. Vacío si la tarea no es posible.")
 
     
 
@@ -66,7 +76,14 @@ def crear_agente_evaluador(drive_service):
       "     - Si la función necesita interactuar con alguna **herramienta externa** o **servicios de API**, descríbelo en detalle."
       "     - Detalla **el orden de ejecución** si la nueva función depende de otras funciones o herramientas."
 
-    "3. **Instrucciones Claras para el Siguiente Agente:**"
+    "3. **Plan Ejecutable (campo `plan`):**"
+    "- Si la tarea es posible, rellena además el campo `plan` con la lista ordenada de llamadas a herramientas que resuelven la tarea."
+    "   - Cada paso indica la `herramienta` (nombre exacto), sus `argumentos` (nombre del parámetro y valor) y `depende_de` (índices de los pasos previos que necesita)."
+    "   - Usa como valores los literales **exactamente como aparecen en la petición del usuario** (nombres de archivo, rutas de carpeta, IDs)."
+    "   - Para usar los IDs devueltos por un paso anterior escribe `$paso_N` como valor (N es el índice del paso, empezando en 0). Si ese paso devuelve varios archivos, el paso se repetirá para cada uno. Ese índice N debe aparecer también en `depende_de`."
+    "   - Si la tarea no es posible, deja `plan` vacío."
+
+    "4. **Instrucciones Claras para el Siguiente Agente:**"
     "- El campo `explicacion` debe ser la **instrucción que recibirá otro agente** para ejecutar la tarea, así que debe contener toda la información necesaria."
     " Debes proporcionar contexto sobre el flujo de trabajo de la tarea."
     "   - Si la tarea es posible, explica **paso a paso** qué hacer y cómo usar las herramientas existentes."
@@ -93,7 +110,7 @@ def crear_agente_evaluador(drive_service):
     "}"
     "```"
 
-    "4. **Detalles Importantes para la Creación de Funciones:**"
+    "5. **Detalles Importantes para la Creación de Funciones:**"
     "- Si indicas que una función debe ser creada, asegúrate de proporcionar **todos los detalles** necesarios para que otro agente pueda desarrollarla."
     "   - Define claramente el propósito de la función, los parámetros que tomará y cómo deben ser procesados."
     "   - Si se requiere utilizar alguna API externa o biblioteca, indícalo claramente con las instrucciones de instalación necesarias y los pasos para su uso."
@@ -1,5 +1,6 @@
 import streamlit as st
 import os
+import uuid
 import shutil # Importamos shutil para inyectarlo en el entorno de ejecución
 from langchain.agents import AgentExecutor, create_react_agent
 from langchain.tools import tool
@@ -7,6 +8,10 @@ from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import PromptTemplate
 from pydantic import BaseModel, Field
 from typing import Dict, Any
+from presupuesto import (PresupuestoAgotado, ejecutar_agente, ejecutar_con_limite, evento_detener, resumen_latencias,
+                         MAX_PASOS_POR_DEFECTO, SEGUNDOS_POR_DEFECTO, TIMEOUT_LLM)
+from trabajos import GestorTrabajos, CANCELADO, ERROR
+from artefactos import AlmacenArtefactos, es_handle, UMBRAL_ARTEFACTO
 
 # --- 1. CONFIGURACIÓN INICIAL Y ESTADO ---
 # ADVERTENCIA DE SEGURIDAD: Nunca uses la clave API hardcodeada en un entorno de producción o público.
@@ -24,12 +29,40 @@ if 'global_state' not in st.session_state:
 
 GLOBAL_STATE = st.session_state.global_state
 
+# Identificador de la sesión para el gestor de trabajos en segundo plano
+if 'id_sesion' not in st.session_state:
+    st.session_state.id_sesion = str(uuid.uuid4())
+
+@st.cache_resource
+def get_almacen_artefactos():
+    """Almacén en disco para los resultados grandes; en GLOBAL_STATE solo se guardan sus handles."""
+    return AlmacenArtefactos()
+
+ALMACEN = get_almacen_artefactos()
+
+def resumir_valor(valor, longitud: int = 50) -> str:
+    # Texto corto para el prompt: la descripción del artefacto o el principio del valor.
+    if not valor:
+        return "None"
+    if es_handle(valor):
+        return ALMACEN.describir(valor)
+    return valor[:longitud] + "..." if len(valor) > longitud else valor
+
+def mensaje_para_chat(msg) -> str:
+    # Los mensajes enormes de print_to_chat también se guardan fuera de la sesión.
+    msg = str(msg)
+    if len(msg) > UMBRAL_ARTEFACTO:
+        return ALMACEN.describir(ALMACEN.guardar(msg))
+    return msg
+
 # --- 2. HERRAMIENTA ÚNICA: Generador y Ejecutor de Código ---
 
 class CodeInput(BaseModel):
     """Define el esquema de entrada de la herramienta para el LLM."""
     code_to_execute: str = Field(
-        description="El código Python completo que realiza la tarea. Debe usar las variables globales GLOBAL_STATE, las librerías 'os' y 'shutil' y la función 'print_to_chat'."
+        description="El código Python completo que realiza la tarea. Debe usar las variables globales GLOBAL_STATE, las librerías 'os' y 'shutil' y la función 'print_to_chat'. "
+                    "En bucles o tareas largas debe comprobar 'detener.is_set()' y terminar si es True (tiempo agotado o petición cancelada). "
+                    "Los valores 'artefacto:<hash>' de GLOBAL_STATE se leen con 'leer_artefacto(handle)' (memoryview sin copia) o 'leer_artefacto_texto(handle)' (str)."
     )
     expected_output_var: str = Field(
         description="El nombre de la variable local en el código Python cuyo valor final debe ser retornado (ej. 'extracted_data' o 'final_path')."
@@ -46,36 +79,52 @@ def CodeGeneratorAndExecutor(code_to_execute: str, expected_output_var: str) ->
     # 1. Definir entorno de ejecución local (controlado)
     local_env = {
         # Función para reportar mensajes al chat
-        "print_to_chat": lambda msg: GLOBAL_STATE["chat_history"].append({"role": "tool_output", "content": msg}),
+        "print_to_chat": lambda msg: GLOBAL_STATE["chat_history"].append({"role": "tool_output", "content": mensaje_para_chat(msg)}),
         "GLOBAL_STATE": GLOBAL_STATE,
         "os": os,
         "shutil": shutil, # <--- ¡CORRECCIÓN CLAVE! Ahora shutil está disponible.
         # SIMULACIÓN de lectura de DOCX para que funcione sin librerías externas
-        "docx_reader_sim": lambda path: "Contenido de Proyecciones Financieras: 2025: +12%; 2026: +9%." 
+        "docx_reader_sim": lambda path: "Contenido de Proyecciones Financieras: 2025: +12%; 2026: +9%.",
+        # Se activa si la petición se cancela o agota su tiempo mientras el código sigue ejecutándose
+        "detener": evento_detener(),
+        # Acceso a resultados anteriores guardados como artefacto
+        "leer_artefacto": ALMACEN.abrir,
+        "leer_artefacto_texto": ALMACEN.leer_texto
     }
     
     try:
         GLOBAL_STATE["chat_history"].append({"role": "agent_thought", "content": "Generando y ejecutando código..."})
         
-        # 2. Ejecutar el código generado por el LLM
-        exec(code_to_execute, local_env)
+        # 2. Ejecutar el código generado por el LLM (como mucho hasta el deadline de la petición)
+        ejecutar_con_limite(exec, code_to_execute, local_env)
         
         # 3. Obtener el resultado final de la variable esperada
         # Buscamos la variable en el entorno local después de la ejecución
         result = local_env.get(expected_output_var, f"Error: Variable '{expected_output_var}' no encontrada después de la ejecución.")
         
         # Convertir listas o estructuras complejas a string para la salida de LangChain
-        if not isinstance(result, str):
+        if isinstance(result, (bytes, bytearray, memoryview)):
+             result = ALMACEN.guardar(result)
+        elif not isinstance(result, str):
              result = str(result)
         
+        # Los resultados grandes van al almacén de artefactos; al LLM y al estado solo llega el handle
+        if len(result) > UMBRAL_ARTEFACTO:
+             result = ALMACEN.guardar(result)
+        
         # 4. Actualizar el estado global con el resultado si aplica
         if expected_output_var == 'final_path' and isinstance(result, str):
              GLOBAL_STATE["latest_output_path"] = result
         if expected_output_var == 'extracted_data' and isinstance(result, str):
              GLOBAL_STATE["latest_extracted_text"] = result
         
+        if es_handle(result):
+             result = ALMACEN.describir(result)
         return f"Código ejecutado con éxito. El LLM puede continuar. Resultado de '{expected_output_var}': {result}"
     
+    except PresupuestoAgotado:
+        # El presupuesto se propaga hasta ejecutar_agente, que devuelve la respuesta parcial
+        raise
     except Exception as e:
         # Reportar errores de ejecución al LLM para que pueda auto-corregirse
         return f"ERROR DE EJECUCIÓN del código: {str(e)}. El LLM debe revisar el código Python generado y re-planificar."
@@ -92,7 +141,9 @@ def get_agent_executor():
     llm = ChatGoogleGenerativeAI(
         model="gemini-2.5-flash", 
         temperature=0.0,
-        google_api_key=api_key 
+        google_api_key=api_key,
+        timeout=TIMEOUT_LLM,
+        max_retries=0
     )
 
     # 2. Definir la herramienta
@@ -130,49 +181,97 @@ def get_agent_executor():
     agent = create_react_agent(llm, tools, prompt)
     
     # handle_parsing_errors=True permite al LLM intentar auto-corregir el formato si falla
-    agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True, handle_parsing_errors=True)
+    # max_iterations/max_execution_time son límites de respaldo; el presupuesto de cada petición corta antes
+    agent_executor = AgentExecutor(
+        agent=agent, tools=tools, verbose=True, handle_parsing_errors=True,
+        max_iterations=MAX_PASOS_POR_DEFECTO, max_execution_time=SEGUNDOS_POR_DEFECTO
+    )
     return agent_executor
 
+@st.cache_resource
+def get_gestor_trabajos():
+    """Pool de trabajos compartido por todas las sesiones que usan el mismo AgentExecutor."""
+    return GestorTrabajos()
+
 # --- 4. INTERFAZ STREAMLIT ---
 
 st.title("🤖 Agente Generativo (LangChain + Gemini) con Chatbot")
 st.caption("El agente genera código Python en tiempo real para resolver tus peticiones.")
 
-# Inicializar el AgentExecutor
+# Inicializar el AgentExecutor y el gestor de trabajos
 executor = get_agent_executor()
+gestor = get_gestor_trabajos()
+
+def ejecutar_peticion_usuario(estado: dict, mensaje_usuario: dict, presupuesto) -> str:
+    """
+    Cuerpo del trabajo en segundo plano. El contexto se construye al arrancar, no al encolar,
+    para que una petición en cola vea el estado y la respuesta de la anterior.
+    """
+    historial = estado["chat_history"]
+    posicion = next(i for i, m in enumerate(historial) if m is mensaje_usuario)
+    # Todo lo anterior a esta petición más lo que hayan añadido después los trabajos previos,
+    # sin las peticiones del usuario que aún están en cola detrás de esta.
+    previos = historial[:posicion] + [m for m in historial[posicion + 1:] if m["role"] != "user"]
+
+    # Construir el contexto para el prompt
+    context = {
+        "latest_extracted_text": resumir_valor(estado["latest_extracted_text"]),
+        "latest_output_path": resumir_valor(estado["latest_output_path"], UMBRAL_ARTEFACTO),
+        "chat_history": "\n".join([f"[{m['role'].upper()}]: {m['content']}" for m in previos[-5:]]),
+        "input": mensaje_usuario["content"]
+    }
 
-# Función para ejecutar el ciclo del agente y actualizar el chat
+    respuesta = ejecutar_agente(executor, context, presupuesto)
+    # La respuesta se añade aquí, justo detrás de su petición, antes de que arranque la siguiente en cola
+    posicion = next(i for i, m in enumerate(historial) if m is mensaje_usuario)
+    historial.insert(posicion + 1, {"role": "agent", "content": respuesta})
+    return respuesta
+
+# Función para encolar el ciclo del agente sin bloquear la interfaz
 def handle_user_input():
     user_input = st.session_state.user_input
     if not user_input:
         return
 
-    GLOBAL_STATE["chat_history"].append({"role": "user", "content": user_input})
-
-    # Construir el contexto para el prompt
-    context = {
-        "latest_extracted_text": GLOBAL_STATE["latest_extracted_text"][:50] + "..." if GLOBAL_STATE["latest_extracted_text"] else "None",
-        "latest_output_path": GLOBAL_STATE["latest_output_path"] if GLOBAL_STATE["latest_output_path"] else "None",
-        "chat_history": "\n".join([f"[{m['role'].upper()}]: {m['content']}" for m in GLOBAL_STATE["chat_history"][-5:]]),
-        "input": user_input
-    }
+    mensaje_usuario = {"role": "user", "content": user_input}
+    GLOBAL_STATE["chat_history"].append(mensaje_usuario)
 
-    try:
-        # Ejecución del agente (el LLM piensa y usa la herramienta CodeGeneratorAndExecutor)
-        with st.spinner("El Agente Generativo está pensando y ejecutando código..."):
-            final_output = executor.invoke(context)
-        
-        agent_response = final_output.get("output", "No se pudo generar una respuesta final.")
-        GLOBAL_STATE["chat_history"].append({"role": "agent", "content": agent_response})
-        
-    except Exception as e:
-        error_msg = f"ERROR CRÍTICO: Fallo al invocar el agente. ¿Está la GEMINI_API_KEY configurada correctamente? Detalle: {e}"
-        GLOBAL_STATE["chat_history"].append({"role": "system_error", "content": error_msg})
-        st.error(error_msg)
+    # Ejecución del agente en segundo plano (el LLM piensa y usa la herramienta CodeGeneratorAndExecutor).
+    # Si la sesión ya tiene un trabajo en curso, este queda en cola detrás.
+    estado = GLOBAL_STATE
+    gestor.enviar(
+        st.session_state.id_sesion,
+        user_input,
+        lambda presupuesto: ejecutar_peticion_usuario(estado, mensaje_usuario, presupuesto)
+    )
 
     # Limpiar el input de usuario
     st.session_state.user_input = ""
 
+@st.fragment(run_every=1)
+def mostrar_trabajo_en_curso():
+    """Consulta el estado del trabajo de la sesión sin bloquear y refresca el chat cuando alguno termina."""
+    terminados = gestor.recoger(st.session_state.id_sesion)
+    for trabajo in terminados:
+        # Las respuestas ya las ha añadido el propio trabajo; aquí solo faltan errores y cancelaciones en cola.
+        if trabajo.estado == ERROR:
+            error_msg = f"ERROR CRÍTICO: Fallo al invocar el agente. ¿Está la GEMINI_API_KEY configurada correctamente? Detalle: {trabajo.error}"
+            GLOBAL_STATE["chat_history"].append({"role": "system_error", "content": error_msg})
+        elif trabajo.estado == CANCELADO and trabajo.resultado is None:
+            GLOBAL_STATE["chat_history"].append({"role": "agent_thought", "content": f"Petición cancelada: {trabajo.descripcion}"})
+    if terminados:
+        st.rerun()
+
+    activo, en_cola = gestor.estado(st.session_state.id_sesion)
+    if not activo:
+        return
+    with st.status(f"El Agente Generativo está trabajando en: {activo.descripcion}", expanded=True):
+        st.write(f"⏱️ {activo.segundos():.1f}s · {en_cola} petición(es) en cola")
+        for salida in activo.salida_parcial():
+            st.code(salida, language='text')
+        if st.button("Cancelar", key=f"cancelar_{activo.id}"):
+            gestor.cancelar(st.session_state.id_sesion)
+
 # Mostrar el historial de chat
 for message in GLOBAL_STATE["chat_history"]:
     role = message["role"]
@@ -190,6 +289,8 @@ for message in GLOBAL_STATE["chat_history"]:
     elif role == "system_error":
         st.chat_message("system").error(content)
 
+# Estado del trabajo en curso (se refresca solo, sin bloquear el resto de la página)
+mostrar_trabajo_en_curso()
 
 # Entrada del usuario en la interfaz de chat
 with st.container():
@@ -215,4 +316,5 @@ st.sidebar.markdown(
     """
 )
 st.sidebar.info("El LLM usado es **Gemini 2.5 Flash** (modelo gratuito en el nivel de desarrollo).")
+st.sidebar.caption(f"⏱️ Latencia: {resumen_latencias()}")
 
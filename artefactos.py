@@ -0,0 +1,156 @@
+# artefactos.py
+# Almacén de artefactos fuera de banda para los resultados grandes del código generado.
+# Cada resultado se escribe una sola vez en disco, direccionado por el hash SHA-256 de
+# su contenido. Al LLM y a la interfaz solo les llega un handle ('artefacto:<hash>') y
+# una vista previa corta; el código generado puede leer el contenido completo sin
+# copiarlo mediante un memoryview sobre un mmap del archivo.
+
+import hashlib
+import mmap
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+DIRECTORIO_ARTEFACTOS = ".artefactos"
+PREFIJO_HANDLE = "artefacto:"
+# Resultados más largos que esto (en caracteres) se guardan como artefacto
+UMBRAL_ARTEFACTO = 2000
+LONGITUD_VISTA_PREVIA = 200
+# Límites del almacén: mmaps abiertos a la vez, tamaño total en disco y antigüedad
+MAX_MAPAS_ABIERTOS = 32
+MAX_BYTES_EN_DISCO = 512 * 1024 * 1024
+MAX_EDAD_SEGUNDOS = 7 * 24 * 3600
+# Los archivos a medio escribir llevan este prefijo; la limpieza no los toca.
+PREFIJO_TEMPORAL = ".tmp-"
+_DIGITOS_HEX = set("0123456789abcdef")
+
+
+def _es_digest(nombre: str) -> bool:
+    return len(nombre) == 64 and set(nombre) <= _DIGITOS_HEX
+
+
+def es_handle(valor) -> bool:
+    return isinstance(valor, str) and valor.startswith(PREFIJO_HANDLE)
+
+
+class AlmacenArtefactos:
+    def __init__(self, directorio: str = DIRECTORIO_ARTEFACTOS, max_mapas: int = MAX_MAPAS_ABIERTOS,
+                 max_bytes: int = MAX_BYTES_EN_DISCO, max_edad: float = MAX_EDAD_SEGUNDOS):
+        self.directorio = directorio
+        self.max_mapas = max_mapas
+        self.max_bytes = max_bytes
+        self.max_edad = max_edad
+        os.makedirs(directorio, exist_ok=True)
+        # Los mmap abiertos se reutilizan entre lecturas (el contenido es inmutable), en orden LRU.
+        self._mapas = OrderedDict()
+        self._lock = threading.Lock()
+        self.limpiar()
+
+    def _ruta(self, handle: str) -> str:
+        if not es_handle(handle):
+            raise ValueError(f"'{handle}' no es un handle de artefacto.")
+        digest = handle[len(PREFIJO_HANDLE):]
+        if not _es_digest(digest):
+            raise ValueError(f"'{handle}' no es un handle de artefacto válido.")
+        return os.path.join(self.directorio, digest)
+
+    def guardar(self, valor) -> str:
+        """Guarda un str o bytes y devuelve su handle. Un contenido repetido no se vuelve a escribir."""
+        datos = valor.encode("utf-8") if isinstance(valor, str) else bytes(valor)
+        handle = PREFIJO_HANDLE + hashlib.sha256(datos).hexdigest()
+        ruta = self._ruta(handle)
+        try:
+            os.utime(ruta)  # Ya existe: se marca como usado recientemente para la limpieza
+            return handle
+        except FileNotFoundError:
+            pass  # No existía o la limpieza de otra sesión lo acaba de borrar: se escribe
+        # Escritura atómica: otra sesión nunca ve un artefacto a medio escribir.
+        fd, temporal = tempfile.mkstemp(dir=self.directorio, prefix=PREFIJO_TEMPORAL)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(datos)
+            os.replace(temporal, ruta)
+        except BaseException:
+            os.remove(temporal)  # Como la limpieza no ve los temporales, no se deja ninguno huérfano
+            raise
+        self.limpiar()
+        return handle
+
+    def limpiar(self) -> None:
+        """
+        Borra los artefactos más antiguos que max_edad y, si aún se supera max_bytes, los
+        usados hace más tiempo. Los handles borrados dejan de poder leerse.
+        """
+        archivos = []
+        for nombre in os.listdir(self.directorio):
+            # Solo artefactos completos: los temporales pueden estar escribiéndose en otra sesión.
+            if not _es_digest(nombre):
+                continue
+            ruta = os.path.join(self.directorio, nombre)
+            try:
+                info = os.stat(ruta)
+            except FileNotFoundError:
+                continue  # Lo ha borrado otra sesión a la vez
+            archivos.append((info.st_mtime, info.st_size, ruta, PREFIJO_HANDLE + nombre))
+        archivos.sort()
+
+        limite_edad = time.time() - self.max_edad
+        total = sum(tamano for _, tamano, _, _ in archivos)
+        for mtime, tamano, ruta, handle in archivos:
+            if mtime >= limite_edad and total <= self.max_bytes:
+                break
+            with self._lock:
+                self._cerrar(handle)
+            try:
+                os.remove(ruta)
+            except FileNotFoundError:
+                pass
+            total -= tamano
+
+    def _cerrar(self, handle: str) -> None:
+        # Requiere self._lock. Si el código generado aún tiene un memoryview del mmap,
+        # no se puede cerrar todavía: se suelta la referencia y se cierra al liberarse.
+        mapa = self._mapas.pop(handle, None)
+        if mapa is not None:
+            try:
+                mapa.close()
+            except BufferError:
+                pass
+
+    def abrir(self, handle: str) -> memoryview:
+        """Devuelve un memoryview de solo lectura sobre el artefacto, sin copiar su contenido."""
+        with self._lock:
+            mapa = self._mapas.get(handle)
+            if mapa is None:
+                ruta = self._ruta(handle)
+                if not os.path.exists(ruta):
+                    raise FileNotFoundError(f"El artefacto '{handle}' ya no está en el almacén.")
+                if os.path.getsize(ruta) == 0:
+                    return memoryview(b"")  # mmap no admite archivos vacíos
+                with open(ruta, "rb") as f:
+                    mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self._mapas[handle] = mapa
+                while len(self._mapas) > self.max_mapas:
+                    self._cerrar(next(iter(self._mapas)))
+            else:
+                self._mapas.move_to_end(handle)
+            return memoryview(mapa)
+
+    def leer_texto(self, handle: str) -> str:
+        """Devuelve el contenido completo como str (esto sí crea una copia)."""
+        return str(self.abrir(handle), "utf-8")
+
+    def tamano(self, handle: str) -> int:
+        return os.path.getsize(self._ruta(handle))
+
+    def vista_previa(self, handle: str, longitud: int = LONGITUD_VISTA_PREVIA) -> str:
+        # Se decodifica solo el principio; un carácter multibyte cortado se descarta.
+        return str(self.abrir(handle)[:longitud * 4], "utf-8", errors="ignore")[:longitud]
+
+    def describir(self, handle: str) -> str:
+        """Resumen corto del artefacto para el LLM y la interfaz: handle, tamaño y vista previa."""
+        if not os.path.exists(self._ruta(handle)):
+            return f"{handle} (eliminado del almacén por antigüedad o espacio)"
+        return f"{handle} ({self.tamano(handle)} bytes). Vista previa: {self.vista_previa(handle)!r}..."
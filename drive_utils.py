@@ -4,6 +4,9 @@ from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from google_auth_httplib2 import AuthorizedHttp
+import httplib2
+from presupuesto import TIMEOUT_DRIVE
 
 # Se define SCOPES en el mismo módulo donde se usa.
 SCOPES = ["https://www.googleapis.com/auth/drive"] 
@@ -22,7 +25,9 @@ def authenticate_google_drive():
         with open("token.json", "w") as token:
             token.write(creds.to_json())
     try:
-        service = build("drive", "v3", credentials=creds)
+        # Timeout de red para que ninguna llamada a Drive se quede colgada indefinidamente
+        http = AuthorizedHttp(creds, http=httplib2.Http(timeout=TIMEOUT_DRIVE))
+        service = build("drive", "v3", http=http)
         return service
     except HttpError as error:
         print(f"Ocurrió un error al construir el servicio de Drive: {error}")
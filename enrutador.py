@@ -0,0 +1,119 @@
+# enrutador.py
+# Enrutador local de intenciones que se pone delante del agente ReAct.
+# Reconoce órdenes simples y sin ambigüedad ("lista mis hojas de cálculo",
+# "mueve a la papelera el archivo con ID X"...), extrae los argumentos con
+# expresiones regulares y llama directamente a la herramienta de tools.py.
+# Si la petición no encaja por completo en ninguna regla, se devuelve None y
+# la petición sigue su camino normal hacia el agente.
+
+import re
+import time
+
+# Un ID de Drive: sin espacios y con una longitud mínima para no confundirlo con una palabra
+_ID = r"(?:el\s+)?(?:archivo\s+|documento\s+|fichero\s+)?(?:con\s+)?(?:el\s+)?\bid\b\s*:?\s*['\"]?(?P<file_id>[A-Za-z0-9_-]{10,})['\"]?"
+_NOMBRE = r"['\"«](?P<file_name>[^'\"»]+)['\"»]"
+# Una carpeta solo se acepta entre comillas o detrás de la palabra "carpeta"; sin comillas
+# no puede tener espacios, para no tragarse el resto de la frase ("de Juan" no es una carpeta).
+_CARPETA = (r"(?:\s+(?:de|en|dentro\s+de)\s+(?:(?:la\s+)?carpeta\s+)?['\"«](?P<folder_path>[^'\"»]+)['\"»]"
+            r"|\s+(?:de|en|dentro\s+de)\s+(?:la\s+)?carpeta\s+(?P<folder_path_simple>[^\s'\"«»]+))?")
+# Palabras que tras "en"/"de" no son nombres de carpeta: mejor que decida el agente
+_NO_SON_CARPETAS = {"papelera", "carpeta", "carpetas", "unidad", "drive", "raíz", "raiz", "mi", "mis", "la", "el"}
+_LISTAR = r"(?:lista(?:r|me)?|mu[eé]stra(?:me)?|ens[eé][ñn]a(?:me)?|dime|ver)\s+(?:mis|los|las|todos\s+los|todas\s+las|todos\s+mis|todas\s+mis)?\s*"
+_PERMANENTE = r"(?:permanentemente|para\s+siempre|definitivamente|del\s+todo)"
+
+_TIPOS = {
+    "hoja": "spreadsheet",
+    "documento": "document",
+    "presentaci": "presentation",
+    "carpeta": "folder",
+}
+
+# (herramienta, patrón); los patrones deben cubrir toda la petición
+_REGLAS = [
+    ("list_files", re.compile(
+        _LISTAR + r"(?P<file_type>hojas\s+de\s+c[aá]lculo|documentos|presentaciones|carpetas)" + _CARPETA, re.IGNORECASE)),
+    ("list_files", re.compile(
+        _LISTAR + r"(?:archivos|ficheros)" + _CARPETA, re.IGNORECASE)),
+    ("delete_permanently", re.compile(
+        r"(?:borra|elimina)\s+" + _PERMANENTE + r"\s+" + _ID, re.IGNORECASE)),
+    ("delete_permanently", re.compile(
+        r"(?:borra|elimina)\s+" + _ID + r"\s+" + _PERMANENTE, re.IGNORECASE)),
+    ("move_to_trash", re.compile(
+        r"(?:mueve|manda|env[ií]a|tira)\s+a\s+la\s+papelera\s+" + _ID, re.IGNORECASE)),
+    ("move_to_trash", re.compile(
+        r"(?:mueve|manda|env[ií]a|tira)\s+" + _ID + r"\s+a\s+la\s+papelera", re.IGNORECASE)),
+    ("move_to_trash", re.compile(
+        r"(?:borra|elimina)\s+" + _ID, re.IGNORECASE)),
+    ("restore_file_from_trash", re.compile(
+        r"(?:restaura|recupera)\s+(?:de\s+la\s+papelera\s+)?" + _ID + r"(?:\s+de\s+la\s+papelera)?", re.IGNORECASE)),
+    ("create_file", re.compile(
+        r"crea(?:r|me)?\s+(?:un\s+)?(?:nuevo\s+)?(?:documento|archivo|doc)\s+(?:nuevo\s+)?(?:llamado\s+|con\s+(?:el\s+)?nombre\s+)?"
+        + _NOMBRE + _CARPETA, re.IGNORECASE)),
+]
+
+
+def _limpiar(texto: str) -> str:
+    texto = " ".join(texto.split())
+    texto = re.sub(r"^por\s+favor,?\s*", "", texto, flags=re.IGNORECASE)
+    texto = re.sub(r",?\s*por\s+favor$", "", texto, flags=re.IGNORECASE)
+    return texto.rstrip(" .!?")
+
+def enrutar(texto: str):
+    """
+    Devuelve (herramienta, argumentos) si la petición es una orden simple reconocida,
+    o (None, None) si no hay suficiente confianza y debe resolverla el agente.
+    """
+    texto = _limpiar(texto)
+    for herramienta, patron in _REGLAS:
+        coincidencia = patron.fullmatch(texto)
+        if not coincidencia:
+            continue
+        argumentos = {k: v.strip() for k, v in coincidencia.groupdict().items() if v}
+        if "folder_path_simple" in argumentos:
+            argumentos["folder_path"] = argumentos.pop("folder_path_simple")
+        if argumentos.get("folder_path", "").lower() in _NO_SON_CARPETAS:
+            return None, None
+        if "file_type" in argumentos:
+            tipo = argumentos["file_type"].lower()
+            argumentos["file_type"] = next(v for k, v in _TIPOS.items() if tipo.startswith(k))
+        return herramienta, argumentos
+    return None, None
+
+
+class EnrutadorIntenciones:
+    """Despacha las órdenes simples directamente y lleva la cuenta de aciertos y latencias."""
+
+    def __init__(self, herramientas: dict):
+        # nombre de herramienta -> función (normalmente las de tools.py)
+        self.herramientas = herramientas
+        self.peticiones = 0
+        self.aciertos = 0
+        self.segundos_directos = []
+        self.segundos_agente = []
+
+    def intentar(self, texto: str):
+        """Ejecuta la petición sin el agente si es posible. Devuelve la respuesta o None."""
+        self.peticiones += 1
+        herramienta, argumentos = enrutar(texto)
+        if herramienta not in self.herramientas:
+            return None
+        inicio = time.perf_counter()
+        respuesta = self.herramientas[herramienta](**argumentos)
+        self.segundos_directos.append(time.perf_counter() - inicio)
+        self.aciertos += 1
+        return respuesta
+
+    def registrar_agente(self, segundos: float) -> None:
+        """Anota la duración de una petición que tuvo que resolver el agente."""
+        self.segundos_agente.append(segundos)
+
+    def resumen(self) -> str:
+        tasa = self.aciertos / self.peticiones * 100 if self.peticiones else 0.0
+        texto = f"enrutador: {self.aciertos}/{self.peticiones} directas ({tasa:.0f}%)"
+        if self.segundos_directos and self.segundos_agente:
+            media_directa = sum(self.segundos_directos) / len(self.segundos_directos)
+            media_agente = sum(self.segundos_agente) / len(self.segundos_agente)
+            ahorro = (media_agente - media_directa) * self.aciertos
+            texto += (f" | media directa: {media_directa:.2f}s vs agente: {media_agente:.2f}s"
+                      f" | ahorro estimado: {ahorro:.1f}s")
+        return texto
@@ -1,14 +1,132 @@
+import argparse
+import csv
+import json
+import os
+import time
+
+from langchain_core.runnables import RunnableLambda
+
 import tools
+import plantillas_plan
 from agente_evaluador_simple import crear_agente_evaluador
 from drive_utils import authenticate_google_drive
+from presupuesto import percentil
+
+# -------------------------------------------------------------------
+# Modo lote: evaluar muchas tareas desde un archivo JSONL o CSV
+# -------------------------------------------------------------------
+def _leer_tareas(ruta: str):
+    """
+    Lee las tareas y devuelve dicts {'id', 'input'}.
+    - JSONL: una tarea por línea, como objeto con 'input' (o 'tarea') y opcionalmente 'id', o como string.
+    - CSV: columnas 'input' (o 'tarea') y opcionalmente 'id'.
+    Si una tarea no tiene 'id' se usa su número de línea.
+    """
+    with open(ruta, "r", encoding="utf-8", newline="") as f:
+        if ruta.lower().endswith(".csv"):
+            filas = csv.DictReader(f)
+        else:
+            filas = (json.loads(linea) for linea in f if linea.strip())
+        for numero, fila in enumerate(filas, start=1):
+            if isinstance(fila, str):
+                fila = {"input": fila}
+            texto = fila.get("input") or fila.get("tarea")
+            if texto:
+                yield {"id": str(fila.get("id") or numero), "input": texto}
+
+def _compactar_salida(ruta_salida: str) -> set:
+    """
+    Checkpoint: deja en ruta_salida una sola fila por id y devuelve los ids ya evaluados.
+    Una fila con resultado gana a cualquier fila de error del mismo id; de las tareas que
+    solo tienen errores se conserva el último, y esas se reintentan al reanudar.
+    """
+    if not os.path.exists(ruta_salida):
+        return set()
+    filas = {}
+    with open(ruta_salida, "r", encoding="utf-8") as f:
+        for linea in f:
+            try:
+                registro = json.loads(linea)
+            except json.JSONDecodeError:
+                continue  # Línea truncada por una interrupción a mitad de escritura
+            anterior = filas.get(registro["id"])
+            if anterior is None or "resultado" not in anterior:
+                filas[registro["id"]] = registro
+
+    temporal = ruta_salida + ".tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        for registro in filas.values():
+            f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+    os.replace(temporal, ruta_salida)
+    return {id_tarea for id_tarea, registro in filas.items() if "resultado" in registro}
+
+def _evaluador_cronometrado(agente):
+    # Envuelve el agente para medir la latencia de cada tarea y no perder el lote por un error.
+    def _evaluar(tarea: dict) -> dict:
+        inicio = time.perf_counter()
+        registro = {"id": tarea["id"], "input": tarea["input"]}
+        try:
+            registro["resultado"] = agente.invoke({"input": tarea["input"]}).model_dump()
+        except Exception as e:
+            registro["error"] = str(e)
+        registro["segundos"] = round(time.perf_counter() - inicio, 3)
+        return registro
+    return RunnableLambda(_evaluar)
+
+def _imprimir_estadisticas(completadas: int, errores: int, latencias: list, inicio: float):
+    transcurrido = time.perf_counter() - inicio
+    ritmo = completadas / transcurrido if transcurrido else 0.0
+    print(f"📊 {completadas} tareas ({errores} con error) en {transcurrido:.1f}s | {ritmo:.2f} tareas/s | "
+          f"p50: {percentil(50, latencias):.2f}s | p95: {percentil(95, latencias):.2f}s")
+
+def evaluar_lote(agente, ruta_tareas: str, ruta_salida: str, concurrencia: int = 4):
+    """
+    Evalúa todas las tareas de ruta_tareas con el agente evaluador, con como mucho
+    'concurrencia' llamadas al LLM en paralelo. Cada AgenteOutput se añade a ruta_salida
+    (JSONL) en cuanto termina, así que el proceso se puede interrumpir y reanudar.
+    Al empezar y al terminar se compacta la salida para que quede una fila por tarea.
+    """
+    completados = _compactar_salida(ruta_salida)
+    if completados:
+        print(f"↩️ Reanudando: {len(completados)} tareas ya evaluadas en '{ruta_salida}'.")
+    # Solo se cargan en memoria las tareas (texto); los resultados se escriben a disco al terminar cada una.
+    pendientes = [t for t in _leer_tareas(ruta_tareas) if t["id"] not in completados]
+
+    evaluador = _evaluador_cronometrado(agente)
+    config = {"max_concurrency": concurrencia}
+    latencias, errores, inicio = [], 0, time.perf_counter()
+
+    with open(ruta_salida, "a", encoding="utf-8") as salida:
+        # batch_as_completed mantiene siempre 'concurrencia' tareas en vuelo: en cuanto
+        # termina una, el pool arranca la siguiente (ventana deslizante, sin esperar por bloques).
+        for _, registro in evaluador.batch_as_completed(pendientes, config=config):
+            salida.write(json.dumps(registro, ensure_ascii=False) + "\n")
+            salida.flush()
+            latencias.append(registro["segundos"])
+            if "error" in registro:
+                errores += 1
+                print(f"⚠️ [{registro['id']}] {registro['error']}")
+            if len(latencias) % 10 == 0:
+                _imprimir_estadisticas(len(latencias), errores, latencias, inicio)
+
+    _compactar_salida(ruta_salida)
+    _imprimir_estadisticas(len(latencias), errores, latencias, inicio)
+
+def _confirmar_paso(herramienta: str, llamadas: list) -> bool:
+    """Muestra las llamadas ya resueltas de un paso que modifica Drive y pide confirmación."""
+    print(f"\n⚠️ El plan va a ejecutar {len(llamadas)} llamada(s) a {herramienta}, que modifica Drive:")
+    for args in llamadas:
+        print(f" - {herramienta}({args})")
+    return input("¿Continuar? [s/N]: ").strip().lower() in ("s", "si", "sí", "y", "yes")
 
 # -------------------------------------------------------------------
 # Ejemplo de inicialización del servicio y ejecución del agente
 # -------------------------------------------------------------------
-def main():
+def main(ruta_tareas: str = None, ruta_salida: str = "resultados.jsonl", concurrencia: int = 4):
     """
     Ejecuta el agente evaluador de herramientas.
     Analiza si una tarea puede realizarse con las herramientas disponibles.
+    Si se indica ruta_tareas, evalúa en lote todas las tareas del archivo.
     """
 
     # 🔧 1. Simula o inicializa el servicio de Google Drive
@@ -22,16 +140,39 @@ def main():
         print("No se pudo crear el agente evaluador. Revisa el servicio de Drive.")
         return
 
+    # 📦 Modo lote
+    if ruta_tareas:
+        evaluar_lote(agente, ruta_tareas, ruta_salida, concurrencia)
+        return
+
     # 🗣️ 3. Solicitud del usuario (puedes cambiarlo libremente)
     consulta = input("👉 Ingresa la tarea que quieres evaluar: ")
 
-    # 🚀 4. Ejecutar el agente con la consulta
+    # ⚡ 4. Si ya hay un plan compilado para esta forma de tarea, se ejecuta sin el LLM
+    plantillas = plantillas_plan.cargar_plantillas()
+    plantilla, valores = plantillas_plan.buscar_plantilla(consulta, plantillas)
+    if plantilla:
+        print(f"\n⚡ Plantilla encontrada: {plantilla['intencion']}")
+        print(f" - valores: {valores}\n")
+        try:
+            for herramienta, args, salida in plantillas_plan.ejecutar_plantilla(plantilla, valores, _confirmar_paso):
+                print(f" - {herramienta}({args}) -> {salida}")
+            plantillas_plan.guardar_plantillas(plantillas)
+        except Exception as e:
+            print(f"⚠️ Error al ejecutar la plantilla: {e}")
+        return
+
+    # 🚀 5. Ejecutar el agente con la consulta
     print("\n🧩 Analizando la tarea...\n")
     try:
         respuesta = agente.invoke({"input": consulta})
         print("✅ Resultado estructurado:")
         print(f" - result: {respuesta.result}")
         print(f" - explicación:\n{respuesta.explicacion}")
+        if respuesta.result and respuesta.plan:
+            plantilla = plantillas_plan.registrar_plan(consulta, respuesta.plan)
+            if plantilla:
+                print(f"\n💾 Plan guardado como plantilla: {plantilla['intencion']}")
     except Exception as e:
         print(f"⚠️ Error al ejecutar el agente evaluador: {e}")
 
@@ -39,4 +180,9 @@ def main():
 # Punto de entrada
 # -------------------------------------------------------------------
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Agente evaluador de herramientas.")
+    parser.add_argument("--lote", help="Archivo JSONL o CSV con las tareas a evaluar en lote.")
+    parser.add_argument("--salida", default="resultados.jsonl", help="Archivo JSONL donde se escriben los resultados del lote.")
+    parser.add_argument("--concurrencia", type=int, default=4, help="Número máximo de llamadas al LLM en paralelo.")
+    args = parser.parse_args()
+    main(args.lote, args.salida, args.concurrencia)
@@ -0,0 +1,258 @@
+# plantillas_plan.py
+# Plantillas de plan compiladas a partir de la salida del agente evaluador.
+# Un plan (herramientas, argumentos y dependencias) se guarda parametrizado y se
+# reutiliza para peticiones futuras con la misma forma, ejecutándolo directamente
+# contra tools.py sin volver a llamar al LLM.
+
+import ast
+import inspect
+import json
+import os
+import re
+
+import tools
+
+ARCHIVO_PLANTILLAS = "plantillas_plan.json"
+
+# Referencia al resultado de un paso anterior dentro de un argumento: '$paso_N'
+_REFERENCIA_PASO = re.compile(r"^\$paso_(\d+)$")
+# Literales entre comillas en la petición del usuario: 'x', "x", «x», `x`
+_LITERAL_ENTRE_COMILLAS = re.compile(r"'([^']+)'|\"([^\"]+)\"|«([^»]+)»|`([^`]+)`")
+# Palabras sueltas que parecen valores (nombres de archivo, rutas, IDs)
+_LITERAL_SUELTO = re.compile(r"\S*[./_\-\d]\S*")
+_ID_EN_SALIDA = re.compile(r"ID[^:\n]*:\s*([\w-]+)")
+_PREFIJOS_ERROR = ("Error", "Ocurrió un error", "No se")
+# Herramientas con efectos sobre Drive: nunca se ejecutan sin confirmación explícita
+HERRAMIENTAS_CON_EFECTOS = {"move_to_trash", "delete_permanently", "create_file", "restore_file_from_trash"}
+# Mismas exclusiones que cargar_herramientas._load_langchain_tools
+_NO_SON_HERRAMIENTAS = {"initialize_tools", "_get_folder_id_from_path"}
+# Qué puede capturar una ranura: nunca comillas ni barras invertidas (los valores acaban
+# dentro de queries de Drive) y solo admite espacios si el literal original iba entre comillas.
+_CAPTURA_ENTRE_COMILLAS = r"[^'\"«»`\\]+"
+_CAPTURA_SIMPLE = r"[^\s'\"«»`\\]+"
+
+
+# -----------------------------------------------------------------------------
+# 1. ALMACENAMIENTO DE PLANTILLAS
+# -----------------------------------------------------------------------------
+def cargar_plantillas(ruta: str = ARCHIVO_PLANTILLAS) -> dict:
+    """Carga las plantillas guardadas, indexadas por la intención parametrizada."""
+    if not os.path.exists(ruta):
+        return {}
+    with open(ruta, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def guardar_plantillas(plantillas: dict, ruta: str = ARCHIVO_PLANTILLAS) -> None:
+    """Escribe las plantillas en disco."""
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump(plantillas, f, ensure_ascii=False, indent=2)
+
+
+# -----------------------------------------------------------------------------
+# 2. COMPILACIÓN: PLAN DEL EVALUADOR -> PLANTILLA PARAMETRIZADA
+# -----------------------------------------------------------------------------
+def _normalizar(texto: str) -> str:
+    return " ".join(texto.split())
+
+def _candidatos_a_ranura(consulta: str) -> dict:
+    # Literal -> si iba entre comillas. Primero los entrecomillados y después las
+    # palabras sueltas con aspecto de valor (nombres de archivo, rutas, IDs).
+    candidatos = {}
+    for grupos in _LITERAL_ENTRE_COMILLAS.findall(consulta):
+        candidatos[next(g for g in grupos if g)] = True
+    for palabra in _LITERAL_SUELTO.findall(consulta):
+        palabra = palabra.strip("'\"«»`.,;:()")
+        if palabra:
+            candidatos.setdefault(palabra, False)
+    return candidatos
+
+def _validar_plan(pasos: list) -> bool:
+    # Un plan solo se guarda si cada paso llama a una herramienta real con argumentos que
+    # existen en su firma, incluye los obligatorios y solo referencia pasos anteriores
+    # que aparezcan en su 'depende_de'.
+    for indice, paso in enumerate(pasos):
+        func = _obtener_herramienta(paso["herramienta"])
+        if func is None:
+            return False
+        parametros = inspect.signature(func).parameters
+        if any(nombre not in parametros for nombre in paso["argumentos"]):
+            return False
+        obligatorios = [n for n, p in parametros.items() if p.default is inspect.Parameter.empty]
+        if any(nombre not in paso["argumentos"] for nombre in obligatorios):
+            return False
+        if any(not 0 <= dependencia < indice for dependencia in paso["depende_de"]):
+            return False
+        for valor in paso["argumentos"].values():
+            referencia = _REFERENCIA_PASO.match(valor)
+            if referencia and int(referencia.group(1)) not in paso["depende_de"]:
+                return False
+    return True
+
+def _plan_a_dicts(plan) -> list:
+    # Acepta tanto los objetos Pydantic del evaluador como dicts ya serializados.
+    pasos = []
+    for paso in plan:
+        if isinstance(paso, dict):
+            pasos.append({
+                "herramienta": paso["herramienta"],
+                "argumentos": dict(paso.get("argumentos", {})),
+                "depende_de": list(paso.get("depende_de", [])),
+            })
+        else:
+            pasos.append({
+                "herramienta": paso.herramienta,
+                "argumentos": {arg.nombre: arg.valor for arg in paso.argumentos},
+                "depende_de": list(paso.depende_de),
+            })
+    return pasos
+
+def compilar_plantilla(consulta: str, plan) -> dict:
+    """
+    Convierte el plan del evaluador en una plantilla parametrizada.
+    Los literales de la petición que aparecen en los argumentos se sustituyen por
+    ranuras ('{ranura_0}', '{ranura_1}', ...) tanto en la intención como en el plan.
+    Devuelve None si el plan está vacío o no es ejecutable tal cual (herramientas
+    desconocidas, argumentos que no están en su firma o referencias '$paso_N' inválidas).
+    """
+    pasos = _plan_a_dicts(plan)
+    if not pasos or not _validar_plan(pasos):
+        return None
+
+    intencion = _normalizar(consulta)
+    candidatos = _candidatos_a_ranura(intencion)
+    ranuras = []
+    capturas = {}
+    # Los más largos primero para no partir un literal que contiene a otro.
+    for literal in sorted(candidatos, key=len, reverse=True):
+        usado = any(literal in valor for p in pasos for valor in p["argumentos"].values()
+                    if not _REFERENCIA_PASO.match(valor))
+        # Evita que un literal corto como '0' reemplace parte de un marcador ya puesto.
+        if not usado or literal not in intencion or any(literal in r for r in ranuras):
+            continue
+        marcador = "{ranura_%d}" % len(ranuras)
+        intencion = intencion.replace(literal, marcador)
+        for p in pasos:
+            # Las referencias '$paso_N' no son literales de la petición: no se tocan.
+            p["argumentos"] = {k: v if _REFERENCIA_PASO.match(v) else v.replace(literal, marcador)
+                               for k, v in p["argumentos"].items()}
+        ranuras.append(marcador[1:-1])
+        capturas[marcador[1:-1]] = _CAPTURA_ENTRE_COMILLAS if candidatos[literal] else _CAPTURA_SIMPLE
+
+    # Se vuelve a validar el plan ya parametrizado, que es el que se guarda.
+    if not _validar_plan(pasos):
+        return None
+
+    patron = re.escape(intencion)
+    for nombre in ranuras:
+        patron = patron.replace(re.escape("{%s}" % nombre), f"(?P<{nombre}>{capturas[nombre]})", 1)
+
+    return {"intencion": intencion, "patron": patron, "ranuras": ranuras, "plan": pasos, "usos": 0}
+
+def registrar_plan(consulta: str, plan, ruta: str = ARCHIVO_PLANTILLAS) -> dict:
+    """Compila el plan y lo guarda como plantilla. Devuelve la plantilla o None."""
+    plantilla = compilar_plantilla(consulta, plan)
+    if plantilla is None:
+        return None
+    plantillas = cargar_plantillas(ruta)
+    plantillas[plantilla["intencion"]] = plantilla
+    guardar_plantillas(plantillas, ruta)
+    return plantilla
+
+
+# -----------------------------------------------------------------------------
+# 3. BÚSQUEDA: PETICIÓN NUEVA -> PLANTILLA + VALORES DE LAS RANURAS
+# -----------------------------------------------------------------------------
+def buscar_plantilla(consulta: str, plantillas: dict):
+    """
+    Busca una plantilla cuya intención coincida con la petición.
+    Devuelve (plantilla, valores_de_ranuras) o (None, None) si ninguna coincide.
+    """
+    consulta = _normalizar(consulta)
+    for plantilla in plantillas.values():
+        coincidencia = re.fullmatch(plantilla["patron"], consulta, flags=re.IGNORECASE)
+        # Segunda barrera por si la plantilla se guardó con un patrón más permisivo
+        if coincidencia and all(re.fullmatch(_CAPTURA_ENTRE_COMILLAS, v) for v in coincidencia.groupdict().values()):
+            return plantilla, coincidencia.groupdict()
+    return None, None
+
+
+# -----------------------------------------------------------------------------
+# 4. EJECUCIÓN DIRECTA CONTRA tools.py
+# -----------------------------------------------------------------------------
+def _obtener_herramienta(nombre: str):
+    # Solo se permiten las funciones que también se cargan como herramientas
+    # (mismo criterio que cargar_herramientas._load_langchain_tools).
+    if nombre.startswith("_") or nombre in _NO_SON_HERRAMIENTAS:
+        return None
+    func = getattr(tools, nombre, None)
+    if not inspect.isfunction(func) or not func.__doc__:
+        return None
+    return func
+
+def _es_error(salida: str) -> bool:
+    return salida.startswith(_PREFIJOS_ERROR)
+
+def _extraer_ids(salida: str) -> list:
+    # list_files devuelve "Archivos encontrados: [(nombre, id), ...]".
+    if salida.startswith("Archivos encontrados:"):
+        try:
+            return [file_id for _, file_id in ast.literal_eval(salida.split(":", 1)[1].strip())]
+        except (ValueError, SyntaxError):
+            return []
+    return _ID_EN_SALIDA.findall(salida)
+
+def ejecutar_plantilla(plantilla: dict, valores: dict, confirmar=None) -> list:
+    """
+    Ejecuta el plan de la plantilla con los valores de las ranuras.
+    Los argumentos '$paso_N' se sustituyen por los IDs devueltos en el paso N; si hay
+    varios, el paso se ejecuta una vez por cada ID.
+    Antes de cada paso con efectos (HERRAMIENTAS_CON_EFECTOS) se llama a
+    confirmar(herramienta, llamadas) con todas las llamadas ya resueltas; si no devuelve
+    True (o no se pasa confirmar) el plan se detiene sin ejecutarlo.
+    Devuelve la lista de (herramienta, argumentos, salida) de cada llamada y se detiene
+    en el primer error.
+    """
+    registro = []
+    # Plantillas guardadas antes de validar los planes al compilarlos
+    if not _validar_plan(plantilla["plan"]):
+        registro.append(("-", {}, "Error: El plan de la plantilla no coincide con las herramientas disponibles."))
+        return registro
+    ids_por_paso = []
+    for paso in plantilla["plan"]:
+        func = _obtener_herramienta(paso["herramienta"])
+        if func is None:
+            registro.append((paso["herramienta"], {}, f"Error: La herramienta '{paso['herramienta']}' no existe."))
+            return registro
+
+        # Resolver ranuras y referencias; cada combinación es una llamada.
+        llamadas = [{}]
+        for nombre, valor in paso["argumentos"].items():
+            referencia = _REFERENCIA_PASO.match(valor)
+            if referencia:
+                indice = int(referencia.group(1))
+                if indice >= len(ids_por_paso):
+                    registro.append((paso["herramienta"], {}, f"Error: El argumento '{nombre}' referencia un paso posterior ({valor})."))
+                    return registro
+                opciones = ids_por_paso[indice]
+            else:
+                for ranura, texto in valores.items():
+                    valor = valor.replace("{%s}" % ranura, texto)
+                opciones = [valor]
+            llamadas = [dict(args, **{nombre: opcion}) for args in llamadas for opcion in opciones]
+
+        if paso["herramienta"] in HERRAMIENTAS_CON_EFECTOS and llamadas:
+            if confirmar is None or not confirmar(paso["herramienta"], llamadas):
+                registro.append((paso["herramienta"], {}, "Cancelado: el paso modifica Drive y no se confirmó."))
+                return registro
+
+        ids_del_paso = []
+        for args in llamadas:
+            salida = str(func(**args))
+            registro.append((paso["herramienta"], args, salida))
+            if _es_error(salida):
+                return registro
+            ids_del_paso.extend(_extraer_ids(salida))
+        ids_por_paso.append(ids_del_paso)
+
+    plantilla["usos"] = plantilla.get("usos", 0) + 1
+    return registro
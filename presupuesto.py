@@ -0,0 +1,236 @@
+# presupuesto.py
+# Presupuesto de ejecución (tiempo, pasos y tokens) para cada petición al agente.
+# El presupuesto activo viaja en una ContextVar, de modo que las llamadas al LLM,
+# cada .execute() de Drive y el CodeGeneratorAndExecutor pueden consultarlo sin
+# tener que pasarlo como parámetro.
+
+import contextvars
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Valores por defecto de cada petición
+SEGUNDOS_POR_DEFECTO = 60
+MAX_PASOS_POR_DEFECTO = 8
+MAX_TOKENS_POR_DEFECTO = 30000
+# Fracción del presupuesto que se reserva para devolver una respuesta parcial
+MARGEN = 0.1
+# Timeouts de red para cada llamada individual. Una llamada solo arranca si queda más
+# que el margen, así que un timeout no mayor que el margen no puede pasarse del deadline.
+# Por lo mismo el LLM no reintenta (max_retries=0): cada reintento sumaría otro timeout.
+TIMEOUT_DRIVE = SEGUNDOS_POR_DEFECTO * MARGEN
+TIMEOUT_LLM = SEGUNDOS_POR_DEFECTO * MARGEN
+
+# Mensaje que devuelve AgentExecutor cuando corta por max_iterations/max_execution_time
+_MENSAJE_DETENIDO = "Agent stopped due to"
+
+_PRESUPUESTO_ACTUAL = contextvars.ContextVar("presupuesto_actual", default=None)
+
+# Duraciones (segundos) de las últimas peticiones ejecutadas, para medir p50/p99.
+# Acotado porque la app de Streamlit es un proceso de larga duración.
+MAX_DURACIONES = 1000
+DURACIONES = deque(maxlen=MAX_DURACIONES)
+
+
+class PresupuestoAgotado(Exception):
+    """Se lanza cuando una petición se queda sin tiempo, pasos o tokens."""
+
+
+class Presupuesto:
+    def __init__(self, segundos: float = SEGUNDOS_POR_DEFECTO, max_pasos: int = MAX_PASOS_POR_DEFECTO,
+                 max_tokens: int = MAX_TOKENS_POR_DEFECTO):
+        self.segundos = segundos
+        self.max_pasos = max_pasos
+        self.max_tokens = max_tokens
+        self.inicio = time.monotonic()
+        self.deadline = self.inicio + segundos
+        self.pasos = 0
+        self.tokens = 0
+        # Resultados de herramientas obtenidos hasta ahora (para la respuesta parcial)
+        self.observaciones = []
+        # Se activa desde otro hilo (p. ej. el botón de cancelar de la app) para cortar la ejecución
+        self.cancelado = threading.Event()
+        # Aviso para el código generado que siguió ejecutándose tras un timeout o cancelación
+        self.detener_codigo = threading.Event()
+        self.codigo_en_segundo_plano = False
+
+    def cancelar(self) -> None:
+        self.cancelado.set()
+
+    def restante(self) -> float:
+        return max(0.0, self.deadline - time.monotonic())
+
+    def transcurrido(self) -> float:
+        return time.monotonic() - self.inicio
+
+    def margen(self) -> float:
+        # Nunca menor que un timeout de llamada, también con presupuestos más cortos.
+        return max(self.segundos * MARGEN, TIMEOUT_DRIVE, TIMEOUT_LLM)
+
+    def motivo_agotado(self) -> str:
+        # Devuelve por qué está (casi) agotado el presupuesto, o None si aún queda.
+        if self.cancelado.is_set():
+            return "cancelado"
+        if self.restante() <= self.margen():
+            return "tiempo"
+        if self.pasos >= self.max_pasos:
+            return "pasos"
+        if self.tokens >= self.max_tokens * (1 - MARGEN):
+            return "tokens"
+        return None
+
+    def comprobar(self, operacion: str) -> None:
+        motivo = self.motivo_agotado()
+        if motivo == "cancelado":
+            raise PresupuestoAgotado(f"Ejecución cancelada por el usuario antes de {operacion}.")
+        if motivo:
+            raise PresupuestoAgotado(f"Presupuesto de {motivo} agotado antes de {operacion}.")
+
+    def respuesta_parcial(self, salida: str = None) -> str:
+        """Devuelve la salida del agente o, si se cortó, la mejor respuesta parcial disponible."""
+        if salida and not salida.startswith(_MENSAJE_DETENIDO):
+            return salida
+        if self.cancelado.is_set():
+            aviso = "Tarea cancelada por el usuario."
+        else:
+            aviso = "No se pudo completar la tarea dentro del presupuesto de la petición."
+        if self.codigo_en_segundo_plano:
+            aviso += (" Atención: el código generado no se detuvo y puede seguir ejecutándose en segundo plano,"
+                      " modificando archivos o el estado de la sesión.")
+        if self.observaciones:
+            return f"{aviso} Último resultado obtenido: {self.observaciones[-1]}"
+        return f"{aviso} No se obtuvo ningún resultado."
+
+
+def presupuesto_actual():
+    return _PRESUPUESTO_ACTUAL.get()
+
+def evento_detener() -> threading.Event:
+    # Evento que el código generado puede consultar para terminar por su cuenta.
+    presupuesto = presupuesto_actual()
+    return presupuesto.detener_codigo if presupuesto else threading.Event()
+
+@contextmanager
+def con_presupuesto(presupuesto: Presupuesto):
+    # Activa el presupuesto para todo lo que se ejecute dentro del bloque y registra su duración.
+    token = _PRESUPUESTO_ACTUAL.set(presupuesto)
+    try:
+        yield presupuesto
+    finally:
+        _PRESUPUESTO_ACTUAL.reset(token)
+        registrar_duracion(presupuesto.transcurrido())
+
+
+# -----------------------------------------------------------------------------
+# PUNTOS DE CONTROL: Drive, código generado y LLM
+# -----------------------------------------------------------------------------
+def ejecutar_peticion(peticion):
+    """Ejecuta una petición de la API de Google (.execute()) comprobando antes el presupuesto."""
+    presupuesto = presupuesto_actual()
+    if presupuesto:
+        presupuesto.comprobar("la llamada a Google Drive")
+    return peticion.execute()
+
+def ejecutar_con_limite(func, *args, **kwargs):
+    """
+    Ejecuta func en un hilo aparte y espera como máximo el tiempo restante del presupuesto.
+    Si no termina a tiempo o se cancela lanza PresupuestoAgotado. Python no permite matar el hilo:
+    se activa presupuesto.detener_codigo para que el código pueda terminar por su cuenta y la
+    respuesta parcial avisa de que puede seguir teniendo efectos.
+    """
+    presupuesto = presupuesto_actual()
+    if not presupuesto:
+        return func(*args, **kwargs)
+    presupuesto.comprobar("ejecutar el código generado")
+
+    resultado = {}
+    def _objetivo():
+        try:
+            resultado["valor"] = func(*args, **kwargs)
+        except BaseException as e:
+            resultado["error"] = e
+
+    contexto = contextvars.copy_context()
+    hilo = threading.Thread(target=contexto.run, args=(_objetivo,), daemon=True)
+    hilo.start()
+    # Espera por tramos cortos para enterarse de una cancelación sin esperar al deadline.
+    while hilo.is_alive() and presupuesto.restante() > 0 and not presupuesto.cancelado.is_set():
+        hilo.join(min(0.2, presupuesto.restante()))
+    if hilo.is_alive():
+        presupuesto.detener_codigo.set()
+        presupuesto.codigo_en_segundo_plano = True
+        raise PresupuestoAgotado("El código generado no terminó dentro del presupuesto de tiempo o se canceló.")
+    if "error" in resultado:
+        raise resultado["error"]
+    return resultado.get("valor")
+
+
+class ControlPresupuesto(BaseCallbackHandler):
+    """Callback que corta la ejecución del agente cuando se agota el presupuesto."""
+
+    # Sin esto LangChain solo registraría la excepción y seguiría ejecutando.
+    raise_error = True
+
+    def __init__(self, presupuesto: Presupuesto):
+        self.presupuesto = presupuesto
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self.presupuesto.comprobar("la llamada al LLM")
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.presupuesto.comprobar("la llamada al LLM")
+
+    def on_llm_end(self, response, **kwargs):
+        uso = (response.llm_output or {}).get("token_usage") or {}
+        tokens = uso.get("total_tokens", 0)
+        if not tokens:
+            for generaciones in response.generations:
+                for generacion in generaciones:
+                    metadatos = getattr(getattr(generacion, "message", None), "usage_metadata", None) or {}
+                    tokens += metadatos.get("total_tokens", 0)
+        self.presupuesto.tokens += tokens
+
+    def on_agent_action(self, action, **kwargs):
+        self.presupuesto.pasos += 1
+
+    def on_tool_end(self, output, **kwargs):
+        self.presupuesto.observaciones.append(str(output))
+
+
+def ejecutar_agente(executor, entrada: dict, presupuesto: Presupuesto = None) -> str:
+    """
+    Invoca un AgentExecutor dentro de un presupuesto y devuelve siempre un texto:
+    la respuesta final o, si se agota el presupuesto, la mejor respuesta parcial.
+    """
+    presupuesto = presupuesto or Presupuesto()
+    salida = None
+    with con_presupuesto(presupuesto):
+        try:
+            resultado = executor.invoke(entrada, config={"callbacks": [ControlPresupuesto(presupuesto)]})
+            salida = resultado.get("output")
+        except PresupuestoAgotado as e:
+            print(f"⏱️ {e}")
+    return presupuesto.respuesta_parcial(salida)
+
+
+# -----------------------------------------------------------------------------
+# MÉTRICAS
+# -----------------------------------------------------------------------------
+def registrar_duracion(segundos: float) -> None:
+    DURACIONES.append(segundos)
+
+def percentil(p: float, valores=None) -> float:
+    # Por defecto sobre las duraciones de las peticiones registradas en este proceso.
+    valores = DURACIONES if valores is None else valores
+    if not valores:
+        return 0.0
+    ordenadas = sorted(valores)
+    indice = min(len(ordenadas) - 1, int(round(p / 100 * (len(ordenadas) - 1))))
+    return ordenadas[indice]
+
+def resumen_latencias() -> str:
+    return (f"últimas {len(DURACIONES)} peticiones | p50: {percentil(50):.2f}s | "
+            f"p99: {percentil(99):.2f}s | máx: {max(DURACIONES, default=0):.2f}s")
@@ -0,0 +1,31 @@
+import pytest
+
+from enrutador import enrutar
+
+
+@pytest.mark.parametrize("texto, esperado", [
+    ("lista mis hojas de cálculo", ("list_files", {"file_type": "spreadsheet"})),
+    ("lista mis documentos en la carpeta Ventas", ("list_files", {"file_type": "document", "folder_path": "Ventas"})),
+    ("lista mis archivos de 'Proyectos 2024'", ("list_files", {"folder_path": "Proyectos 2024"})),
+    ("mueve a la papelera el archivo con ID 1AbCdEfGhIjK", ("move_to_trash", {"file_id": "1AbCdEfGhIjK"})),
+    ("borra id: 1AbCdEfGhIjK para siempre", ("delete_permanently", {"file_id": "1AbCdEfGhIjK"})),
+    ("crea un documento llamado 'Acta' en la carpeta Proyectos",
+     ("create_file", {"file_name": "Acta", "folder_path": "Proyectos"})),
+])
+def test_ordenes_simples(texto, esperado):
+    assert enrutar(texto) == esperado
+
+
+@pytest.mark.parametrize("texto", [
+    # "id" dentro de una palabra no es la palabra clave ID: el nombre lo resuelve el agente
+    "borra el archivo idiomas_final_2024",
+    "mueve a la papelera el documento identificador_largo",
+    # Una palabra suelta tras "de"/"en" no es una carpeta
+    "lista mis documentos de Juan",
+    "crea un documento llamado 'Acta' en Proyectos",
+    # Palabras reservadas que no son nombres de carpeta
+    "lista mis archivos en la carpeta papelera",
+    "lista mis documentos de 'unidad'",
+])
+def test_sin_confianza_se_deja_al_agente(texto):
+    assert enrutar(texto) == (None, None)
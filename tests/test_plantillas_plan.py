@@ -0,0 +1,90 @@
+import pytest
+
+pytest.importorskip("googleapiclient")
+
+import plantillas_plan
+import tools
+
+
+class HerramientasFalsas:
+    """Sustituye las herramientas de tools.py y apunta cada llamada."""
+
+    def __init__(self, monkeypatch):
+        self.llamadas = []
+        registro = self.llamadas
+
+        def list_files(file_type: str = None, folder_path: str = None, query: str = "") -> str:
+            """Lista archivos."""
+            registro.append(("list_files", folder_path))
+            return "Archivos encontrados: [('a.docx', 'ID_A'), ('b.docx', 'ID_B')]"
+
+        def move_to_trash(file_id: str) -> str:
+            """Mueve a la papelera."""
+            registro.append(("move_to_trash", file_id))
+            return f"Éxito: Archivo con ID: {file_id} movido a la papelera."
+
+        monkeypatch.setattr(tools, "list_files", list_files)
+        monkeypatch.setattr(tools, "move_to_trash", move_to_trash)
+
+
+@pytest.fixture
+def herramientas(monkeypatch):
+    return HerramientasFalsas(monkeypatch)
+
+
+PLAN_PAPELERA = [
+    {"herramienta": "list_files", "argumentos": {"folder_path": "0"}, "depende_de": []},
+    {"herramienta": "move_to_trash", "argumentos": {"file_id": "$paso_0"}, "depende_de": [0]},
+]
+
+
+def test_las_referencias_a_pasos_no_se_convierten_en_ranuras(herramientas):
+    plantilla = plantillas_plan.compilar_plantilla("Mueve a la papelera todo lo de la carpeta 0", PLAN_PAPELERA)
+
+    assert plantilla["plan"][0]["argumentos"] == {"folder_path": "{ranura_0}"}
+    assert plantilla["plan"][1]["argumentos"] == {"file_id": "$paso_0"}
+
+
+def test_compilar_buscar_y_ejecutar_con_confirmacion(herramientas):
+    plantilla = plantillas_plan.compilar_plantilla("Mueve a la papelera todo lo de la carpeta 0", PLAN_PAPELERA)
+    encontrada, valores = plantillas_plan.buscar_plantilla(
+        "mueve a la papelera todo lo de la carpeta Ventas", {plantilla["intencion"]: plantilla})
+    assert encontrada is plantilla
+    assert valores == {"ranura_0": "Ventas"}
+
+    confirmadas = []
+    def confirmar(herramienta, llamadas):
+        confirmadas.append((herramienta, llamadas))
+        return True
+
+    registro = plantillas_plan.ejecutar_plantilla(plantilla, valores, confirmar)
+
+    assert confirmadas == [("move_to_trash", [{"file_id": "ID_A"}, {"file_id": "ID_B"}])]
+    assert herramientas.llamadas == [("list_files", "Ventas"), ("move_to_trash", "ID_A"), ("move_to_trash", "ID_B")]
+    assert len(registro) == 3
+
+
+@pytest.mark.parametrize("confirmar", [None, lambda herramienta, llamadas: False])
+def test_sin_confirmacion_no_se_ejecutan_pasos_con_efectos(herramientas, confirmar):
+    plantilla = plantillas_plan.compilar_plantilla("Mueve a la papelera todo lo de la carpeta 0", PLAN_PAPELERA)
+
+    registro = plantillas_plan.ejecutar_plantilla(plantilla, {"ranura_0": "Ventas"}, confirmar)
+
+    assert herramientas.llamadas == [("list_files", "Ventas")]
+    assert registro[-1][2].startswith("Cancelado")
+
+
+def test_las_ranuras_no_capturan_comillas(herramientas):
+    plan = [{"herramienta": "list_files", "argumentos": {"query": "name contains 'informe'"}, "depende_de": []}]
+    plantilla = plantillas_plan.compilar_plantilla("lista lo que se llame 'informe'", plan)
+
+    assert plantillas_plan.buscar_plantilla("lista lo que se llame 'a' or name contains 'b'",
+                                            {plantilla["intencion"]: plantilla}) == (None, None)
+
+
+@pytest.mark.parametrize("nombre", ["HttpError", "MediaIoBaseDownload", "initialize_tools",
+                                    "_get_folder_id_from_path", "presupuesto"])
+def test_solo_se_aceptan_herramientas_reales(nombre):
+    assert plantillas_plan._obtener_herramienta(nombre) is None
+    plan = [{"herramienta": nombre, "argumentos": {}, "depende_de": []}]
+    assert plantillas_plan.compilar_plantilla("haz algo", plan) is None
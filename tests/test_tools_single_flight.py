@@ -0,0 +1,101 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("googleapiclient")
+pytest.importorskip("langchain_core")
+
+import tools
+from presupuesto import Presupuesto, PresupuestoAgotado, con_presupuesto
+
+N_HILOS = 8
+
+
+class FakeDrive:
+    """Servidor de Drive falso: files().list(...).execute() tarda y cuenta las llamadas reales."""
+
+    def __init__(self, respuesta=None, error=None):
+        self.respuesta = respuesta if respuesta is not None else {"files": [{"id": "ID_1", "name": "Informe.docx"}]}
+        self.error = error
+        self.llamadas = 0
+        self.liberar = threading.Event()
+
+    def files(self):
+        return self
+
+    def list(self, **params):
+        return self
+
+    def execute(self):
+        self.llamadas += 1
+        # El líder no termina hasta que el resto de hilos está esperando su resultado.
+        self.liberar.wait(5)
+        if self.error is not None:
+            raise self.error
+        return self.respuesta
+
+
+@pytest.fixture
+def drive(monkeypatch):
+    monkeypatch.setattr(tools, "SINGLE_FLIGHT_STATS", {"llamadas_api": 0, "llamadas_ahorradas": 0})
+    servidor = FakeDrive()
+    monkeypatch.setattr(tools, "DRIVE_SERVICE", servidor)
+    return servidor
+
+
+def _lanzar_en_paralelo(funcion, servidor):
+    resultados, errores = [], []
+
+    def _hilo():
+        try:
+            resultados.append(funcion())
+        except Exception as e:
+            errores.append(e)
+
+    hilos = [threading.Thread(target=_hilo) for _ in range(N_HILOS)]
+    for hilo in hilos:
+        hilo.start()
+    limite = time.monotonic() + 5
+    while tools.SINGLE_FLIGHT_STATS["llamadas_ahorradas"] < N_HILOS - 1 and time.monotonic() < limite:
+        time.sleep(0.01)
+    servidor.liberar.set()
+    for hilo in hilos:
+        hilo.join(5)
+    return resultados, errores
+
+
+def test_lecturas_identicas_comparten_una_llamada(drive):
+    resultados, errores = _lanzar_en_paralelo(lambda: tools.get_file_id_by_name("Informe.docx"), drive)
+
+    assert errores == []
+    assert drive.llamadas == 1
+    assert tools.SINGLE_FLIGHT_STATS == {"llamadas_api": 1, "llamadas_ahorradas": N_HILOS - 1}
+    assert resultados == ["Éxito: ID del archivo 'Informe.docx' es: ID_1"] * N_HILOS
+
+
+def test_el_error_del_lider_llega_a_todos(drive):
+    drive.error = RuntimeError("fallo de Drive")
+    _, errores = _lanzar_en_paralelo(
+        lambda: tools._list_files_compartido(q="name = 'Informe.docx'", fields="files(id, name)"), drive)
+
+    assert drive.llamadas == 1
+    assert len(errores) == N_HILOS
+    assert all(e is drive.error for e in errores)
+
+
+def test_queries_equivalentes_comparten_clave():
+    assert tools._clave_list({"q": "name='a  b'   and trashed=false", "fields": "files(id, name)"}) == \
+        tools._clave_list({"q": "name = 'a  b' and trashed = false", "fields": "files(id,name)"})
+    assert tools._clave_list({"q": "name = 'a b'"}) != tools._clave_list({"q": "name = 'a  b'"})
+
+
+def test_presupuesto_agotado_no_se_registra_como_lider(drive):
+    presupuesto = Presupuesto()
+    presupuesto.cancelar()
+    with con_presupuesto(presupuesto):
+        with pytest.raises(PresupuestoAgotado):
+            tools._list_files_compartido(q="name = 'x'")
+
+    assert drive.llamadas == 0
+    assert tools._LLAMADAS_EN_CURSO == {}
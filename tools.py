@@ -3,17 +3,92 @@
 # CUALQUIER FUNCIÓN CON UN DOCSTRING SERÁ CARGADA AUTOMÁTICamente COMO UNA HERRAMIENTA.
 
 import io
+import re
+import threading
 from googleapiclient.errors import HttpError
 from googleapiclient.http import MediaIoBaseDownload
+# Se importa el módulo (no sus funciones) para que no se carguen como herramientas
+import presupuesto
 
 DRIVE_SERVICE = None
 
+# --- Single-flight para lecturas concurrentes idénticas ---
+# Si varias sesiones o llamadas en paralelo piden el mismo files().list a la vez,
+# solo la primera llega a la API; el resto espera y recibe el mismo resultado o error.
+_LLAMADAS_EN_CURSO = {}
+_LLAMADAS_LOCK = threading.Lock()
+SINGLE_FLIGHT_STATS = {"llamadas_api": 0, "llamadas_ahorradas": 0}
+_TROZO_ENTRE_COMILLAS = re.compile(r"('(?:[^'\\]|\\.)*')")
+
 def initialize_tools(service):
     # Esta función no tiene docstring, por lo que no será cargada como herramienta.
     global DRIVE_SERVICE
     DRIVE_SERVICE = service
     print("Herramientas inicializadas con el servicio de Drive.")
 
+class _LlamadaEnCurso:
+    def __init__(self):
+        self.terminada = threading.Event()
+        self.resultado = None
+        self.error = None
+
+def _canonicalizar_query(query: str) -> str:
+    # Normaliza espacios y operadores fuera de los literales entre comillas,
+    # que se conservan tal cual porque forman parte del valor buscado.
+    trozos = _TROZO_ENTRE_COMILLAS.split(query or "")
+    for i in range(0, len(trozos), 2):
+        trozo = re.sub(r"\s+", " ", trozos[i])
+        trozos[i] = re.sub(r"\s*(!=|=|<|>)\s*", r" \1 ", trozo)
+    return "".join(trozos).strip()
+
+def _clave_list(list_params: dict) -> tuple:
+    clave = {}
+    for nombre, valor in list_params.items():
+        if nombre == "q":
+            valor = _canonicalizar_query(valor)
+        elif nombre == "fields":
+            valor = valor.replace(" ", "")
+        clave[nombre] = valor
+    return tuple(sorted(clave.items()))
+
+def _list_files_compartido(**list_params) -> dict:
+    # Ejecuta DRIVE_SERVICE.files().list(**list_params) compartiendo la llamada
+    # con cualquier otra idéntica (query, fields y pageToken) que esté en curso.
+    clave = _clave_list(list_params)
+    # El presupuesto se comprueba antes de poder ser líder: si esta petición está agotada
+    # o cancelada, su PresupuestoAgotado no debe llegar a las de otras sesiones que esperan.
+    actual = presupuesto.presupuesto_actual()
+    if actual:
+        actual.comprobar("la llamada a Google Drive")
+    with _LLAMADAS_LOCK:
+        llamada = _LLAMADAS_EN_CURSO.get(clave)
+        es_lider = llamada is None
+        if es_lider:
+            llamada = _LlamadaEnCurso()
+            _LLAMADAS_EN_CURSO[clave] = llamada
+            SINGLE_FLIGHT_STATS["llamadas_api"] += 1
+        else:
+            SINGLE_FLIGHT_STATS["llamadas_ahorradas"] += 1
+
+    if not es_lider:
+        # Se espera como mucho lo que le quede al presupuesto de esta petición.
+        if not llamada.terminada.wait(actual.restante() if actual else None):
+            raise presupuesto.PresupuestoAgotado("Presupuesto de tiempo agotado esperando una llamada compartida a Google Drive.")
+        if llamada.error is not None:
+            raise llamada.error
+        return llamada.resultado
+
+    try:
+        llamada.resultado = DRIVE_SERVICE.files().list(**list_params).execute()
+        return llamada.resultado
+    except Exception as e:
+        llamada.error = e
+        raise
+    finally:
+        with _LLAMADAS_LOCK:
+            del _LLAMADAS_EN_CURSO[clave]
+        llamada.terminada.set()
+
 def _get_folder_id_from_path(path: str) -> str:
     # Función auxiliar sin docstring para que no sea cargada como herramienta.
     if not path or path == '/':
@@ -22,7 +97,7 @@ def _get_folder_id_from_path(path: str) -> str:
     current_folder_id = 'root'
     for part in parts:
         query = f"mimeType = 'application/vnd.google-apps.folder' and name = '{part}' and '{current_folder_id}' in parents and trashed = false"
-        results = DRIVE_SERVICE.files().list(q=query, fields="files(id, name)").execute()
+        results = _list_files_compartido(q=query, fields="files(id, name)")
         items = results.get('files', [])
         if not items:
             raise FileNotFoundError(f"No se pudo encontrar la carpeta '{part}' dentro de la ruta '{path}'")
@@ -57,7 +132,7 @@ def get_file_id_by_name(file_name: str, folder_path: str = None) -> str:
     list_params = {"pageSize": 1, "fields": "files(id, name)", "q": final_query}
 
     try:
-        results = DRIVE_SERVICE.files().list(**list_params).execute()
+        results = _list_files_compartido(**list_params)
         items = results.get("files", [])
         
         if not items:
@@ -107,7 +182,7 @@ def list_files(file_type: str = None, folder_path: str = None, query: str = "")
     list_params = {"pageSize": 25, "fields": "nextPageToken, files(id, name)", "q": final_query}
 
     try:
-        results = DRIVE_SERVICE.files().list(**list_params).execute()
+        results = _list_files_compartido(**list_params)
         items = results.get("files", [])
         if not items:
             return "No se encontraron archivos que coincidan con los criterios de búsqueda."
@@ -128,7 +203,7 @@ def move_to_trash(file_id: str) -> str:
         return "Error: El servicio de Google Drive no está autenticado."
     try:
         body = {'trashed': True}
-        DRIVE_SERVICE.files().update(fileId=file_id, body=body).execute()
+        presupuesto.ejecutar_peticion(DRIVE_SERVICE.files().update(fileId=file_id, body=body))
         return f"Archivo con ID '{file_id}' movido a la papelera exitosamente."
     except HttpError as error:
         return f"Ocurrió un error al mover el archivo a la papelera: {error}"
@@ -143,7 +218,7 @@ def delete_permanently(file_id: str) -> str:
     if not DRIVE_SERVICE:
         return "Error: El servicio de Google Drive no está autenticado."
     try:
-        DRIVE_SERVICE.files().delete(fileId=file_id).execute()
+        presupuesto.ejecutar_peticion(DRIVE_SERVICE.files().delete(fileId=file_id))
         return f"Archivo con ID '{file_id}' eliminado permanentemente."
     except HttpError as error:
         if error.resp.status == 404:
@@ -165,7 +240,7 @@ def create_file(file_name: str, folder_path: str = None) -> str:
                 file_metadata['parents'] = [folder_id]
             except FileNotFoundError as e:
                 return str(e)
-        file = DRIVE_SERVICE.files().create(body=file_metadata, fields="id, name").execute()
+        file = presupuesto.ejecutar_peticion(DRIVE_SERVICE.files().create(body=file_metadata, fields="id, name"))
         return f"Archivo '{file.get('name')}' creado con éxito. ID: {file.get('id')}"
     except HttpError as error:
         return f"Ocurrió un error al crear el archivo: {error}"
@@ -181,11 +256,11 @@ def restore_file_from_trash(file_id: str) -> str:
         return "Error: El servicio de Google Drive no está autenticado."
     try:
         file_metadata = {'trashed': False}
-        restored_file = DRIVE_SERVICE.files().update(
+        restored_file = presupuesto.ejecutar_peticion(DRIVE_SERVICE.files().update(
             fileId=file_id,
             body=file_metadata,
             fields='id, name, trashed'
-        ).execute()
+        ))
         return f"Archivo '{restored_file.get('name')}' (ID: {restored_file.get('id')}) restaurado de la papelera."
     except HttpError as error:
         return f"Ocurrió un error HTTP al restaurar el archivo {file_id}: {error}"
\ No newline at end of file
@@ -0,0 +1,142 @@
+# trabajos.py
+# Ejecución de agentes en segundo plano para la app de Streamlit.
+# Cada sesión tiene como mucho un trabajo en ejecución; las peticiones que llegan
+# mientras tanto quedan en su cola y arrancan al terminar el anterior. Un único
+# pool de hilos, compartido por todas las sesiones, limita la concurrencia total.
+
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from presupuesto import Presupuesto
+
+MAX_TRABAJOS_CONCURRENTES = 2
+# Trabajos terminados que nadie recoge (p. ej. la sesión se cerró): caducan pasado este
+# tiempo y como mucho se guardan estos por sesión, para que el gestor no crezca sin límite.
+SEGUNDOS_SIN_RECOGER = 15 * 60
+MAX_TERMINADOS_POR_SESION = 20
+
+# Estados posibles de un trabajo
+EN_COLA = "en_cola"
+EJECUTANDO = "ejecutando"
+COMPLETADO = "completado"
+CANCELADO = "cancelado"
+ERROR = "error"
+
+_ids = itertools.count(1)
+
+
+class Trabajo:
+    def __init__(self, sesion: str, descripcion: str, funcion):
+        self.id = next(_ids)
+        self.sesion = sesion
+        self.descripcion = descripcion
+        # funcion(presupuesto) -> str; el presupuesto se crea al arrancar, no al encolar
+        self.funcion = funcion
+        self.estado = EN_COLA
+        self.presupuesto = None
+        self.resultado = None
+        self.error = None
+        self.creado = time.monotonic()
+        self.terminado_en = None
+        self.cancelado = threading.Event()
+
+    @property
+    def terminado(self) -> bool:
+        return self.estado in (COMPLETADO, CANCELADO, ERROR)
+
+    def salida_parcial(self) -> list:
+        """Resultados de herramientas obtenidos hasta ahora."""
+        return list(self.presupuesto.observaciones) if self.presupuesto else []
+
+    def segundos(self) -> float:
+        return self.presupuesto.transcurrido() if self.presupuesto else 0.0
+
+
+class GestorTrabajos:
+    """Cola de trabajos por sesión sobre un pool de hilos compartido."""
+
+    def __init__(self, max_concurrencia: int = MAX_TRABAJOS_CONCURRENTES):
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrencia, thread_name_prefix="agente")
+        self._lock = threading.Lock()
+        self._activos = {}     # sesion -> Trabajo en ejecución (o enviado al pool)
+        self._colas = {}       # sesion -> deque de Trabajos pendientes
+        self._terminados = {}  # sesion -> lista de Trabajos terminados sin recoger
+
+    def enviar(self, sesion: str, descripcion: str, funcion) -> Trabajo:
+        """Encola funcion(presupuesto) para la sesión y la arranca si la sesión está libre."""
+        trabajo = Trabajo(sesion, descripcion, funcion)
+        with self._lock:
+            self._colas.setdefault(sesion, deque()).append(trabajo)
+            self._arrancar_siguiente(sesion)
+        return trabajo
+
+    def cancelar(self, sesion: str) -> None:
+        """Cancela el trabajo en curso de la sesión y vacía su cola."""
+        with self._lock:
+            for trabajo in self._colas.pop(sesion, deque()):
+                trabajo.estado = CANCELADO
+                self._archivar(trabajo)
+            activo = self._activos.get(sesion)
+        if activo:
+            activo.cancelado.set()
+            if activo.presupuesto:
+                activo.presupuesto.cancelar()
+
+    def estado(self, sesion: str):
+        """Devuelve (trabajo activo o None, número de trabajos en cola)."""
+        with self._lock:
+            return self._activos.get(sesion), len(self._colas.get(sesion, ()))
+
+    def recoger(self, sesion: str) -> list:
+        """Devuelve y olvida los trabajos terminados de la sesión."""
+        with self._lock:
+            return self._terminados.pop(sesion, [])
+
+    def _arrancar_siguiente(self, sesion: str) -> None:
+        # Requiere tener self._lock.
+        cola = self._colas.get(sesion)
+        if sesion in self._activos or not cola:
+            return
+        trabajo = cola.popleft()
+        if not cola:
+            del self._colas[sesion]
+        self._activos[sesion] = trabajo
+        self._pool.submit(self._ejecutar, trabajo)
+
+    def _archivar(self, trabajo: Trabajo) -> None:
+        # Requiere tener self._lock. Guarda el trabajo para recoger() y de paso descarta
+        # los terminados que llevan demasiado tiempo sin recoger en cualquier sesión.
+        trabajo.terminado_en = time.monotonic()
+        terminados = self._terminados.setdefault(trabajo.sesion, [])
+        terminados.append(trabajo)
+        del terminados[:-MAX_TERMINADOS_POR_SESION]
+        limite = trabajo.terminado_en - SEGUNDOS_SIN_RECOGER
+        for sesion in list(self._terminados):
+            vigentes = [t for t in self._terminados[sesion] if t.terminado_en >= limite]
+            if vigentes:
+                self._terminados[sesion] = vigentes
+            else:
+                del self._terminados[sesion]
+
+    def _ejecutar(self, trabajo: Trabajo) -> None:
+        # Si se canceló mientras esperaba un hilo libre, ni siquiera arranca.
+        if trabajo.cancelado.is_set():
+            trabajo.estado = CANCELADO
+        else:
+            trabajo.presupuesto = Presupuesto()
+            if trabajo.cancelado.is_set():
+                trabajo.presupuesto.cancelar()
+            trabajo.estado = EJECUTANDO
+            try:
+                trabajo.resultado = trabajo.funcion(trabajo.presupuesto)
+                trabajo.estado = CANCELADO if trabajo.cancelado.is_set() else COMPLETADO
+            except Exception as e:
+                trabajo.error = str(e)
+                trabajo.estado = ERROR
+        with self._lock:
+            del self._activos[trabajo.sesion]
+            self._archivar(trabajo)
+            self._arrancar_siguiente(trabajo.sesion)
@@ -9,6 +9,8 @@ from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from google_auth_httplib2 import AuthorizedHttp
+import httplib2
 
 # --- Importaciones de LangChain ---
 from langchain.agents import AgentExecutor, create_react_agent
@@ -17,6 +19,12 @@ from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain import hub
 from langchain.memory import ConversationBufferMemory
 
+import tools as drive_tools
+from cargar_herramientas import _load_langchain_tools
+from enrutador import EnrutadorIntenciones
+from presupuesto import (Presupuesto, ejecutar_agente, ejecutar_peticion, registrar_duracion, resumen_latencias,
+                         MAX_PASOS_POR_DEFECTO, SEGUNDOS_POR_DEFECTO, TIMEOUT_DRIVE, TIMEOUT_LLM)
+
 # Alcance completo para permitir todas las acciones necesarias
 SCOPES = ["https://www.googleapis.com/auth/drive"]
 
@@ -39,7 +47,9 @@ def authenticate_google_drive():
             token.write(creds.to_json())
     
     try:
-        service = build("drive", "v3", credentials=creds)
+        # Timeout de red para que ninguna llamada a Drive se quede colgada indefinidamente
+        http = AuthorizedHttp(creds, http=httplib2.Http(timeout=TIMEOUT_DRIVE))
+        service = build("drive", "v3", http=http)
         return service
     except HttpError as error:
         print(f"Ocurrió un error al construir el servicio de Drive: {error}")
@@ -61,7 +71,7 @@ def list_files(query: str = "") -> str:
         list_params['q'] = query
 
     try:
-        results = DRIVE_SERVICE.files().list(**list_params).execute()
+        results = ejecutar_peticion(DRIVE_SERVICE.files().list(**list_params))
         items = results.get("files", [])
         if not items:
             return "No se encontraron archivos que coincidan con la búsqueda."
@@ -81,7 +91,7 @@ def move_to_trash(file_id: str) -> str:
         return "Error: El servicio de Google Drive no está autenticado."
     try:
         body = {'trashed': True}
-        DRIVE_SERVICE.files().update(fileId=file_id, body=body).execute()
+        ejecutar_peticion(DRIVE_SERVICE.files().update(fileId=file_id, body=body))
         return f"Archivo con ID '{file_id}' movido a la papelera exitosamente."
     except HttpError as error:
         return f"Ocurrió un error al mover el archivo a la papelera: {error}"
@@ -96,7 +106,7 @@ def delete_permanently(file_id: str) -> str:
     if not DRIVE_SERVICE:
         return "Error: El servicio de Google Drive no está autenticado."
     try:
-        DRIVE_SERVICE.files().delete(fileId=file_id).execute()
+        ejecutar_peticion(DRIVE_SERVICE.files().delete(fileId=file_id))
         return f"Archivo con ID '{file_id}' eliminado permanentemente."
     except HttpError as error:
         if error.resp.status == 404:
@@ -109,7 +119,7 @@ def create_file(file_name: str) -> str:
         return "Error: El servicio de Google Drive no está autenticado."
     try:
         file_metadata = {"name": file_name, "mimeType": "application/vnd.google-apps.document"}
-        file = DRIVE_SERVICE.files().create(body=file_metadata, fields="id, name").execute()
+        file = ejecutar_peticion(DRIVE_SERVICE.files().create(body=file_metadata, fields="id, name"))
         return f"Archivo '{file.get('name')}' creado con éxito. ID: {file.get('id')}"
     except HttpError as error:
         return f"Ocurrió un error al crear el archivo: {error}"
@@ -146,7 +156,7 @@ def run_agent():
     ]
 
     # Usando el modelo que solicitaste
-    llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0)
+    llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0, timeout=TIMEOUT_LLM, max_retries=0)
     
     prompt_template = hub.pull("hwchase17/react-chat")
 
@@ -159,9 +169,16 @@ def run_agent():
         tools=tools, 
         verbose=True, 
         handle_parsing_errors=True,
-        memory=memory
+        memory=memory,
+        # Límites de respaldo; el presupuesto de cada petición corta antes y devuelve una respuesta parcial
+        max_iterations=MAX_PASOS_POR_DEFECTO,
+        max_execution_time=SEGUNDOS_POR_DEFECTO
     )
 
+    # Enrutador rápido: las órdenes simples van directas a las herramientas de tools.py sin pasar por el LLM
+    drive_tools.initialize_tools(DRIVE_SERVICE)
+    enrutador = EnrutadorIntenciones({t.name: t.func for t in _load_langchain_tools(drive_tools)})
+
     print("Agente de Google Drive (con borrado dual y memoria) iniciado. Escribe 'salir' para terminar.")
     while True:
         prompt = input("¿Qué te gustaría hacer en Google Drive?: ")
@@ -169,10 +186,21 @@ def run_agent():
             break
         
         try:
-            result = agent_executor.invoke({"input": prompt})
+            presupuesto = Presupuesto()
+            respuesta = enrutador.intentar(prompt)
+            if respuesta is not None:
+                registrar_duracion(presupuesto.transcurrido())
+                # Se guarda en la memoria para que el agente tenga el contexto en la siguiente petición
+                memory.save_context({"input": prompt}, {"output": respuesta})
+            else:
+                presupuesto = Presupuesto()
+                respuesta = ejecutar_agente(agent_executor, {"input": prompt}, presupuesto)
+                enrutador.registrar_agente(presupuesto.transcurrido())
             
             print("\nRespuesta del Agente:")
-            print(result["output"])
+            print(respuesta)
+            print(f"⏱️ {presupuesto.transcurrido():.2f}s, {presupuesto.pasos} pasos, {presupuesto.tokens} tokens | {resumen_latencias()}")
+            print(f"🔀 {enrutador.resumen()}")
             print("-" * 30)
         except Exception as e:
             print(f"\nHa ocurrido un error durante la ejecución del agente: {e}")